@@ -3,207 +3,358 @@ import re
 import pandas as pd
 import io
 import math
-from fpdf import FPDF
+import pickle
+from xml.sax.saxutils import escape
+import numpy as np
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import (PageBreak, Paragraph, SimpleDocTemplate, Spacer,
+                                Table, TableStyle)
+
+# --- Expresiones Regulares (compiladas una sola vez al importar el módulo) ---
+# Cada patrón se busca por separado: una sola expresión con alternativas
+# resulta más lenta en CPython, porque cada coincidencia crea un objeto Match
+# que luego hay que clasificar en Python.
+_GROUP_BEGIN_RE = re.compile(r'GROUP_BEGIN\([^,]*,\s*"([^"]*)"')
+_TOOL_RE = re.compile(r'T="([^"]*)"')
+_QUOTED_RE = re.compile(r'"[^"]*"')  # Nombres de grupo y herramienta
+_COORD_RE = re.compile(r'([XYZ])([-\d.]+)')
+_FEED_RE = re.compile(r'F([-\d.]+)')
+_RPM_RE = re.compile(r'S(\d+)')
+_G_CODE_RE = re.compile(r'G0?([01])')  # Busca G0, G1, G00, G01
+
+
+# --- Columnas del Búfer Numérico ---
+# El análisis registra una fila por línea de cada grupo; NaN indica que la
+# palabra no aparece en esa línea y hereda el valor anterior.
+_COL_GROUP, _COL_X, _COL_Y, _COL_Z, _COL_FEED, _COL_RPM, _COL_MOTION, _COL_G95 = range(8)
+_NUM_COLS = 8
+
+
+def _forward_fill(column, initial):
+    """
+    Propaga el último valor definido (no NaN) de una columna modal hacia las
+    filas siguientes; antes del primer valor se usa `initial`.
+    """
+    defined = ~np.isnan(column)
+    last_index = np.where(defined, np.arange(column.size), -1)
+    np.maximum.accumulate(last_index, out=last_index)
+    return np.where(last_index >= 0, column[last_index], initial)
 
 
-def parse_gcode_for_time_and_tools(file_content):
+def _accumulate(rows, num_groups):
+    """
+    Calcula de forma vectorizada el tiempo (seg) y la distancia (mm) de corte
+    de cada grupo a partir del búfer de filas del análisis.
     """
-    Analiza el contenido de un archivo G-code para extraer herramientas, grupos
+    # --- Estado de la Máquina Virtual (persiste a lo largo del archivo) ---
+    x = _forward_fill(rows[:, _COL_X], 0.0)
+    y = _forward_fill(rows[:, _COL_Y], 0.0)
+    z = _forward_fill(rows[:, _COL_Z], 0.0)
+    feed = _forward_fill(rows[:, _COL_FEED], 0.0)
+    rpm = _forward_fill(rows[:, _COL_RPM], 1.0)
+    g95_active = _forward_fill(rows[:, _COL_G95], 0.0) == 1.0
+    motion_mode = _forward_fill(rows[:, _COL_MOTION], 0.0)
+
+    # Las filas sin coordenadas repiten la posición anterior: distancia 0.
+    distance = np.hypot(np.hypot(np.diff(x, prepend=0.0), np.diff(y, prepend=0.0)),
+                        np.diff(z, prepend=0.0))
+
+    # Se calcula el tiempo SOLO si el modo de movimiento es G1 (corte).
+    cutting = (motion_mode == 1.0) & (distance > 0)
+    valid_feed = (feed > 0) & (~g95_active | (rpm > 0))
+    feed_rate = np.where(g95_active, feed * rpm, feed)
+    seconds = np.divide(distance, feed_rate, out=np.zeros_like(distance),
+                        where=cutting & valid_feed) * 60
+
+    group_ids = rows[:, _COL_GROUP].astype(np.intp)
+    times = np.bincount(group_ids, weights=seconds, minlength=num_groups)
+    distances = np.bincount(
+        group_ids, weights=np.where(cutting, distance, 0.0), minlength=num_groups)
+    return times, distances
+
+
+def parse_gcode_for_time_and_tools(line_iter):
+    """
+    Analiza las líneas de un archivo G-code para extraer herramientas, grupos
     y calcular un tiempo, distancia, avances y RPMs estimados para cada grupo,
     respetando la naturaleza modal de los comandos G y F.
+
+    `line_iter` puede ser cualquier iterable de líneas (p. ej. el propio archivo
+    abierto), de modo que el contenido se procesa sin cargarlo entero en memoria.
     """
     results = []
     current_group_info = None
 
-    # --- Estado de la Máquina Virtual (persiste a lo largo del archivo) ---
-    pos = {'X': 0.0, 'Y': 0.0, 'Z': 0.0}
-    rpm = 1.0
-    # El avance (feed) es modal. Se mantiene activo hasta que se comanda uno nuevo.
-    feed = 0.0
-    g95_active = False  # Modo de avance (G95: por revolución)
-    # El modo de movimiento (G0/G1) es modal.
-    motion_mode = 'G0'
-
-    # --- Expresiones Regulares ---
-    group_begin_re = re.compile(r'GROUP_BEGIN\([^,]*,\s*"([^"]*)"')
-    group_end_re = re.compile(r'GROUP_END')
-    tool_re = re.compile(r'T="([^"]*)"')
-    coord_re = re.compile(r'([XYZ])([-\d.]+)')
-    feed_re = re.compile(r'F([-\d.]+)')
-    rpm_re = re.compile(r'S(\d+)')
-    g_code_re = re.compile(r'G0?([01])')  # Busca G0, G1, G00, G01
-
-    for line in file_content.splitlines():
+    # --- Búfer de Filas para `_accumulate` ---
+    # Lista plana de _NUM_COLS valores por fila; se convierte de una vez al final.
+    rows = []
+    nan = math.nan
+
+    for line in line_iter:
+        if line.startswith(';'):  # Línea de comentario completa
+            continue
+
+        # --- Nombres entre Comillas ---
+        # Solo una línea con comillas puede abrir un grupo o nombrar una
+        # herramienta. Después se eliminan los nombres para que sus letras no
+        # se lean como coordenadas, avances o RPMs.
+        match = tool_match = None
+        if '"' in line:
+            match = _GROUP_BEGIN_RE.search(line)
+            tool_match = _TOOL_RE.search(line)
+            line = _QUOTED_RE.sub('', line)
+
         # --- Manejo de Grupos ---
-        match = group_begin_re.search(line)
+        # Cada grupo se registra al abrirse; su índice en `results` identifica
+        # sus filas en el búfer.
         if match:
-            if current_group_info:
-                results.append(current_group_info)
             current_group_info = {
                 "Herramienta": "N/A",
                 "Grupo": match.group(1),
                 "Tiempo Corte Est. (seg)": 0.0,
                 "Distancia Corte (mm)": 0.0,
-                "Avances": set(),
-                "RPMs": set()
+                "Avances": [],
+                "RPMs": []
             }
-
-        if group_end_re.search(line) and current_group_info:
             results.append(current_group_info)
+
+        if 'GROUP_END' in line and current_group_info:
             current_group_info = None
 
         if not current_group_info:
             continue
 
         # --- Actualización del Estado Modal de la Máquina ---
-        g_match = g_code_re.search(line)
-        if g_match:
-            motion_mode = f"G{g_match.group(1)}"
-
-        if "G95" in line:
-            g95_active = True
-        if "G94" in line:
-            g95_active = False
-
-        rpm_match = rpm_re.search(line)
-        if rpm_match:
-            rpm = float(rpm_match.group(1))
-            current_group_info["RPMs"].add(int(rpm))
-
-        feed_match = feed_re.search(line)
-        if feed_match:
-            # Se actualiza el valor modal del avance.
-            feed = float(feed_match.group(1))
-            current_group_info["Avances"].add(feed)
-
-        tool_match = tool_re.search(line)
+        # Cada búsqueda se salta si la letra con la que empieza su palabra no
+        # aparece en la línea: `in` es un recorrido en C sin máquina de regex.
+        motion = g95 = rpm = feed = nan
+        if 'G' in line:
+            g_match = _G_CODE_RE.search(line)
+            if g_match:
+                motion = float(g_match.group(1))
+
+            # G94 prevalece si ambas aparecen en la misma línea, como antes.
+            if 'G9' in line:
+                if "G94" in line:
+                    g95 = 0.0
+                elif "G95" in line:
+                    g95 = 1.0
+
+        if 'S' in line:
+            rpm_match = _RPM_RE.search(line)
+            if rpm_match:
+                rpm = float(rpm_match.group(1))
+                current_group_info["RPMs"].append(int(rpm))
+
+        if 'F' in line:
+            feed_match = _FEED_RE.search(line)
+            if feed_match:
+                # Se actualiza el valor modal del avance.
+                feed = float(feed_match.group(1))
+                current_group_info["Avances"].append(feed)
+
         if tool_match:
             current_group_info["Herramienta"] = tool_match.group(1)
 
         # --- Procesamiento de Movimiento ---
-        coords_found = coord_re.findall(line)
-        if coords_found:
-            target_pos = pos.copy()
-            for axis, value in coords_found:
-                target_pos[axis] = float(value)
-
-            distance = math.sqrt(
-                (target_pos['X'] - pos['X'])**2 +
-                (target_pos['Y'] - pos['Y'])**2 +
-                (target_pos['Z'] - pos['Z'])**2
-            )
-
-            # Se calcula el tiempo SOLO si el modo de movimiento es G1 (corte).
-            # Se utiliza el valor de avance (feed) que esté activo en ese momento.
-            if motion_mode == 'G1' and distance > 0:
-                time_for_move = 0.0
-                if g95_active and rpm > 0 and feed > 0:
-                    time_for_move = (distance / (feed * rpm)) * 60
-                elif not g95_active and feed > 0:
-                    time_for_move = (distance / feed) * 60
-
-                current_group_info["Tiempo Corte Est. (seg)"] += time_for_move
-                current_group_info["Distancia Corte (mm)"] += distance
-
-            # La posición de la herramienta se actualiza siempre, sin importar el modo.
-            pos = target_pos
-
-    if current_group_info:
-        results.append(current_group_info)
+        # Los ejes no programados quedan en NaN y conservan su posición anterior.
+        x = y = z = nan
+        for axis, value in _COORD_RE.findall(line):
+            if axis == 'X':
+                x = float(value)
+            elif axis == 'Y':
+                y = float(value)
+            else:
+                z = float(value)
+        rows.extend((len(results) - 1, x, y, z, feed, rpm, motion, g95))
+
+    # --- Cálculo Vectorizado de Tiempos y Distancias ---
+    times, distances = _accumulate(
+        np.array(rows, dtype=np.float64).reshape(-1, _NUM_COLS), len(results))
+
+    for group_info, seconds, distance in zip(results, times.tolist(), distances.tolist()):
+        group_info["Tiempo Corte Est. (seg)"] = seconds
+        group_info["Distancia Corte (mm)"] = distance
+        # Avances y RPMs se acumulan tal cual y se depuran una sola vez al final.
+        group_info["Avances"] = sorted(set(group_info["Avances"]))
+        group_info["RPMs"] = sorted(set(group_info["RPMs"]))
 
     return results
 
 
+@st.cache_data(show_spinner=False)
+def _parse_cached(content_bytes: bytes) -> list:
+    """
+    Versión cacheada de `parse_gcode_for_time_and_tools`. La clave es el
+    contenido del archivo, de modo que volver a subir el mismo archivo no
+    repite el análisis.
+    """
+    # BytesIO comparte el búfer de `content_bytes` y las líneas se decodifican
+    # a medida que el análisis las pide: no se crea el texto completo.
+    # newline='': los saltos "\r\n" y "\r" terminan la línea igual que "\n",
+    # pero se entregan sin traducir; ninguna búsqueda depende del fin de línea.
+    stringio = io.TextIOWrapper(
+        io.BytesIO(content_bytes), encoding='utf-8', errors='replace', newline='')
+    return parse_gcode_for_time_and_tools(stringio)
+
+
+# Caracteres que las fuentes estándar del PDF (latin-1) no pueden representar.
+_NON_LATIN1_RE = re.compile(r'[^\x00-\xff]')
+
+
+def _latin1_safe(text, max_len=None):
+    """
+    Recorta `text` a `max_len` caracteres y sustituye por '?' los que no
+    existen en latin-1, en una sola pasada y sin crear objetos bytes.
+    """
+    return _NON_LATIN1_RE.sub('?', text[:max_len])
+
+
+# --- Formato de las Tablas del Reporte PDF ---
+_ITEM_HEADERS = ["ID", "Herramienta", "Grupo", "RPM (S)",
+                 "Avance (F)", "Distancia (mm)", "Tiempo Est."]
+_ITEM_COL_WIDTHS = [w * mm for w in (15, 45, 70, 25, 25, 30, 40)]
+_CELL_PADDING = 6  # Relleno horizontal por defecto de cada celda (pt)
+# Una fila más alta que la página hace fallar `doc.build` (LayoutError): cada
+# celda se limita a las líneas que caben holgadamente en una página apaisada.
+_MAX_CELL_LINES = 30
+
+_BASE_TABLE_STYLE = [
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+]
+
+
+def _wrap_cell(text, width, font_size=9, font_name='Helvetica'):
+    """
+    Parte `text` en líneas que caben en una columna de ancho `width` (pt);
+    las celdas de texto plano de reportlab no ajustan el texto por sí solas.
+    Si superan `_MAX_CELL_LINES`, la última línea visible se sustituye por "...".
+    """
+    available = width - 2 * _CELL_PADDING
+    lines = []
+    for line in simpleSplit(text, font_name, font_size, available):
+        # simpleSplit solo corta en espacios: una palabra más ancha que la columna
+        # (p. ej. "FRESA_PLANA_D20_Z4_LARGA") se corta además por caracteres.
+        while len(line) > 1 and stringWidth(line, font_name, font_size) > available:
+            cut = len(line) - 1
+            while cut > 1 and stringWidth(line[:cut], font_name, font_size) > available:
+                cut -= 1
+            lines.append(line[:cut])
+            line = line[cut:]
+        lines.append(line)
+    if len(lines) > _MAX_CELL_LINES:
+        lines = lines[:_MAX_CELL_LINES - 1] + ["..."]
+    return "\n".join(lines)
+
+
 def create_pdf_report(files_data, comparison_df):
     """
     Genera un reporte en PDF con los datos de las herramientas y tiempos.
     """
-    pdf = FPDF(orientation='L')
-    pdf.add_page()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4),
+                            leftMargin=10 * mm, rightMargin=10 * mm,
+                            topMargin=10 * mm, bottomMargin=10 * mm)
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle('ReportTitle', parent=styles['Title'],
+                                 fontName='Helvetica-Bold', fontSize=16)
+    heading_style = ParagraphStyle('ReportHeading', parent=styles['Heading2'],
+                                   fontName='Helvetica-Bold', fontSize=12)
 
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, "Reporte de Herramientas y Tiempos CNC", 0, 1, "C")
-    pdf.ln(10)
+    story = [Paragraph("Reporte de Herramientas y Tiempos CNC", title_style),
+             Spacer(0, 5 * mm)]
 
+    widths = _ITEM_COL_WIDTHS
     for file_data in files_data:
-        pdf.set_font("Arial", "B", 12)
-        pdf.cell(0, 10, f"Herramientas en: {file_data['name']}", 0, 1)
-
-        pdf.set_font("Arial", "B", 10)
-        pdf.cell(15, 10, "ID", 1)
-        pdf.cell(45, 10, "Herramienta", 1)
-        pdf.cell(70, 10, "Grupo", 1)
-        pdf.cell(25, 10, "RPM (S)", 1)
-        pdf.cell(25, 10, "Avance (F)", 1)
-        pdf.cell(30, 10, "Distancia (mm)", 1)
-        pdf.cell(40, 10, "Tiempo Est.", 1)
-        pdf.ln()
-
-        pdf.set_font("Arial", "", 9)
+        story.append(Paragraph(
+            f"Herramientas en: {escape(file_data['name'])}", heading_style))
+
+        # --- Filas de la Tabla (todas las cadenas se preparan antes de maquetar) ---
+        data = [_ITEM_HEADERS]
+        for item in file_data['data']:
+            segundos = item.get('Tiempo Corte Est. (seg)', 0.0)
+            data.append([
+                item["ID"],
+                _wrap_cell(_latin1_safe(item["Herramienta"], 25), widths[1]),
+                _wrap_cell(_latin1_safe(item["Grupo"], 40), widths[2]),
+                _wrap_cell(", ".join(map(str, item.get('RPMs', []))), widths[3]),
+                _wrap_cell(", ".join(map(str, item.get('Avances', []))), widths[4]),
+                f"{item.get('Distancia Corte (mm)', 0.0):.2f}",
+                f"{segundos:.0f}s ({segundos / 60:.2f}m)",
+            ])
+
+        table_style = _BASE_TABLE_STYLE + [
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ]
         if file_data['data']:
-            for item in file_data['data']:
-                herramienta_safe = item["Herramienta"][:25].encode(
-                    'latin-1', 'replace').decode('latin-1')
-                grupo_safe = item["Grupo"][:40].encode(
-                    'latin-1', 'replace').decode('latin-1')
-
-                segundos = item.get('Tiempo Corte Est. (seg)', 0.0)
-                minutos = segundos / 60
-                tiempo_str = f"{segundos:.0f}s ({minutos:.2f}m)"
-                distancia_str = f"{item.get('Distancia Corte (mm)', 0.0):.2f}"
-                avances_str = ", ".join(
-                    map(str, sorted(list(item.get('Avances', set())))))
-                rpms_str = ", ".join(
-                    map(str, sorted(list(item.get('RPMs', set())))))
-
-                pdf.cell(15, 10, item["ID"], 1)
-                pdf.cell(45, 10, herramienta_safe, 1)
-                pdf.cell(70, 10, grupo_safe, 1)
-                pdf.cell(25, 10, rpms_str, 1)
-                pdf.cell(25, 10, avances_str, 1)
-                pdf.cell(30, 10, distancia_str, 1)
-                pdf.cell(40, 10, tiempo_str, 1)
-                pdf.ln()
-
             # --- Fila de Totales en PDF ---
-            total_distancia = sum(item.get('Distancia Corte (mm)', 0.0)
-                                  for item in file_data['data'])
-            total_tiempo_seg = sum(
-                item.get('Tiempo Corte Est. (seg)', 0.0) for item in file_data['data'])
+            # Se reutilizan los totales que `main()` calculó con pandas al mostrar la
+            # tabla; si no están (otro llamador, o la tabla no se mostró), se suman aquí.
+            totals = file_data.get('_totals')
+            if totals is None:
+                totals = (
+                    sum(item.get('Distancia Corte (mm)', 0.0) for item in file_data['data']),
+                    sum(item.get('Tiempo Corte Est. (seg)', 0.0) for item in file_data['data']))
+            total_distancia, total_tiempo_seg = totals
             total_tiempo_min = total_tiempo_seg / 60
 
-            pdf.set_font("Arial", "B", 10)
-            pdf.cell(15 + 45 + 70 + 25 + 25, 10, "TOTALES", 1, 0, 'R')
-            pdf.cell(30, 10, f"{total_distancia:.2f}", 1)
-            pdf.cell(
-                40, 10, f"{total_tiempo_seg:.0f}s ({total_tiempo_min:.2f}m)", 1)
-            pdf.ln()
-
+            data.append(["TOTALES", "", "", "", "",
+                         f"{total_distancia:.2f}",
+                         f"{total_tiempo_seg:.0f}s ({total_tiempo_min:.2f}m)"])
+            table_style += [
+                ('SPAN', (0, -1), (4, -1)),
+                ('ALIGN', (0, -1), (4, -1), 'RIGHT'),
+                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, -1), (-1, -1), 10),
+            ]
         else:
-            pdf.cell(0, 10, "No se encontraron herramientas.", 1, 1)
-        pdf.ln(5)
+            data.append(["No se encontraron herramientas.", "", "", "", "", "", ""])
+            table_style.append(('SPAN', (0, -1), (-1, -1)))
+
+        story.append(Table(data, colWidths=widths, repeatRows=1, hAlign='LEFT',
+                           style=TableStyle(table_style)))
+        story.append(Spacer(0, 5 * mm))
 
     if not comparison_df.empty:
-        pdf.add_page()
-        pdf.set_font("Arial", "B", 12)
-        pdf.cell(0, 10, "Tabla Comparativa de Herramientas", 0, 1)
+        story.append(PageBreak())
+        story.append(Paragraph("Tabla Comparativa de Herramientas", heading_style))
+
+        # Con varias columnas, los nombres de archivo y de herramienta largos no
+        # caben en una línea: se parten igual que en las tablas por archivo.
+        col_width = 270 * mm / len(comparison_df.columns)
+        data = [[_wrap_cell(_latin1_safe(col), col_width, 10, 'Helvetica-Bold')
+                 for col in comparison_df.columns]]
+        data += [[_wrap_cell(_latin1_safe(str(item)), col_width, 10) for item in row]
+                 for row in comparison_df.itertuples(index=False, name=None)]
 
-        pdf.set_font("Arial", "B", 10)
-        col_width = 270 / len(comparison_df.columns)
-        for col in comparison_df.columns:
-            col_safe = col.encode('latin-1', 'replace').decode('latin-1')
-            pdf.cell(col_width, 10, col_safe, 1)
-        pdf.ln()
+        story.append(Table(data, colWidths=[col_width] * len(comparison_df.columns),
+                           repeatRows=1, hAlign='LEFT',
+                           style=TableStyle(_BASE_TABLE_STYLE + [
+                               ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+                               ('FONTSIZE', (0, 1), (-1, -1), 10),
+                           ])))
 
-        pdf.set_font("Arial", "", 10)
-        for index, row in comparison_df.iterrows():
-            for item in row:
-                item_safe = str(item).encode(
-                    'latin-1', 'replace').decode('latin-1')
-                pdf.cell(col_width, 10, item_safe, 1)
-            pdf.ln()
+    doc.build(story)
+    return buffer.getvalue()
 
-    return bytes(pdf.output(dest='S'))
+
+def _join_value_lists(column):
+    """
+    Convierte una columna de listas (Avances, RPMs) en texto "a, b, c" sin
+    recorrer las filas en Python; las listas vacías se muestran como "N/A".
+    """
+    joined = column.explode().dropna().astype(str).groupby(level=0).agg(", ".join)
+    return joined.reindex(column.index, fill_value="N/A")
 
 
 def main():
@@ -226,8 +377,10 @@ def main():
     st.markdown(
         "Sube, analiza y edita las listas de herramientas y calcula el tiempo de mecanizado estimado.")
 
-    if 'original_data' not in st.session_state:
-        st.session_state.original_data = None
+    # Los datos originales se guardan serializados: un único objeto bytes, del
+    # que se reconstruye una copia independiente al restaurar.
+    if 'original_blob' not in st.session_state:
+        st.session_state.original_blob = None
     if 'edited_data' not in st.session_state:
         st.session_state.edited_data = None
 
@@ -243,15 +396,11 @@ def main():
             if file:
                 uploaded_files.append(file)
 
-    if len(uploaded_files) == num_files and st.session_state.original_data is None:
+    if len(uploaded_files) == num_files and st.session_state.original_blob is None:
         try:
             all_files_data = []
             for i, file in enumerate(uploaded_files):
-                stringio = io.TextIOWrapper(
-                    file, encoding='utf-8', errors='replace')
-                file_content = stringio.read()
-
-                processed_groups = parse_gcode_for_time_and_tools(file_content)
+                processed_groups = _parse_cached(file.getvalue())
 
                 for j, item in enumerate(processed_groups):
                     item["ID"] = f"{i+1}.{j+1}"
@@ -259,12 +408,13 @@ def main():
                 all_files_data.append(
                     {"name": file.name, "data": processed_groups})
 
-            st.session_state.original_data = all_files_data
-            st.session_state.edited_data = [d.copy() for d in all_files_data]
+            st.session_state.original_blob = pickle.dumps(
+                all_files_data, protocol=5)
+            st.session_state.edited_data = all_files_data
             st.success("¡Archivos procesados y tiempos calculados!")
         except Exception as e:
             st.error(f"Ocurrió un error al procesar los archivos: {e}")
-            st.session_state.original_data = st.session_state.edited_data = None
+            st.session_state.original_blob = st.session_state.edited_data = None
 
     if st.session_state.edited_data:
         st.info("ℹ️ **Nota sobre la estimación de tiempo**:\n"
@@ -273,8 +423,8 @@ def main():
         st.header("Herramientas por Archivo (Editable)")
 
         if st.button("Restaurar Datos Originales"):
-            st.session_state.edited_data = [
-                d.copy() for d in st.session_state.original_data]
+            st.session_state.edited_data = pickle.loads(
+                st.session_state.original_blob)
             st.toast("Datos restaurados.")
 
         res_cols = st.columns(num_files)
@@ -284,20 +434,13 @@ def main():
                 if file_data['data']:
                     df = pd.DataFrame(file_data['data'])
                     # Crear columnas de display formateadas
-                    df['Tiempo Formateado'] = df['Tiempo Corte Est. (seg)'].apply(
-                        lambda s: f"{s:.0f}s ({s/60:.2f}m)"
-                    )
-                    df['Distancia Formateada'] = df['Distancia Corte (mm)'].apply(
-                        lambda d: f"{d:.2f} mm"
-                    )
-                    df['Avance Formateado'] = df['Avances'].apply(
-                        lambda s: ", ".join(
-                            map(str, sorted(list(s)))) if s else "N/A"
-                    )
-                    df['RPM Formateado'] = df['RPMs'].apply(
-                        lambda s: ", ".join(
-                            map(str, sorted(list(s)))) if s else "N/A"
-                    )
+                    segundos = df['Tiempo Corte Est. (seg)']
+                    df['Tiempo Formateado'] = (segundos.map('{:.0f}s'.format) +
+                                               (segundos / 60).map(' ({:.2f}m)'.format))
+                    df['Distancia Formateada'] = df['Distancia Corte (mm)'].map(
+                        '{:.2f} mm'.format)
+                    df['Avance Formateado'] = _join_value_lists(df['Avances'])
+                    df['RPM Formateado'] = _join_value_lists(df['RPMs'])
 
                     edited_df = st.data_editor(df,
                                                column_order=("ID", "Herramienta", "Grupo", "RPM Formateado",
@@ -324,6 +467,7 @@ def main():
                     total_distancia = df['Distancia Corte (mm)'].sum()
                     total_tiempo_seg = df['Tiempo Corte Est. (seg)'].sum()
                     total_tiempo_min = total_tiempo_seg / 60
+                    file_data['_totals'] = (total_distancia, total_tiempo_seg)
 
                     metric_cols = st.columns(2)
                     with metric_cols[0]:
@@ -338,19 +482,34 @@ def main():
 
         st.header("Tabla Comparativa de Herramientas")
 
-        all_unique_tools_set = {item['Herramienta']
-                                for file_data in st.session_state.edited_data for item in file_data['data']}
+        # Una sola pasada: cada herramienta acumula un bit por archivo en el que aparece.
+        # Un nombre repetido (dos subidas de "PROG.MPF") se numera como su archivo
+        # para que las columnas no se dupliquen; los nombres únicos quedan igual.
+        uploaded_names = [file_data['name']
+                          for file_data in st.session_state.edited_data]
+        file_names = []
+        tool_to_mask = {}
+        for file_index, file_data in enumerate(st.session_state.edited_data):
+            name = file_data['name']
+            if uploaded_names.count(name) > 1 or name == "Herramienta":
+                name = f"{file_index + 1}. {name}"
+            file_names.append(name)
+            bit = 1 << file_index
+            for item in file_data['data']:
+                tool = item['Herramienta']
+                if tool is not None:
+                    tool_to_mask[tool] = tool_to_mask.get(tool, 0) | bit
 
-        if not all_unique_tools_set:
+        if not tool_to_mask:
             st.warning("No hay herramientas para comparar.")
+            df_comparison = pd.DataFrame()
         else:
+            tools = sorted(tool_to_mask)
+            masks = np.array([tool_to_mask[tool] for tool in tools])
+            present = (masks[:, None] >> np.arange(len(file_names))) & 1
             df_comparison = pd.DataFrame(
-                [{
-                    "Herramienta": tool,
-                    **{file_data["name"]: 'X' if tool in {d["Herramienta"] for d in file_data["data"]} else ''
-                       for file_data in st.session_state.edited_data}
-                } for tool in sorted(list(all_unique_tools_set))]
-            )
+                np.where(present, 'X', ''), columns=file_names, dtype=object)
+            df_comparison.insert(0, "Herramienta", tools)
             st.dataframe(df_comparison, use_container_width=True)
 
         st.markdown("---")